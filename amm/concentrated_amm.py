@@ -0,0 +1,266 @@
+import bisect
+import math
+from typing import Dict, List, Optional, Tuple
+
+from toy_amm import Trade, TradeAforB, TradeBforA
+
+# Prices of B in A are 1.0001^tick, as in Uniswap v3
+MIN_TICK = -887272
+MAX_TICK = 887272
+
+
+def sqrt_price_at_tick(tick: int) -> float:
+    """Get the square root of the price of B in A at a tick"""
+    return 1.0001 ** (tick / 2)
+
+
+def tick_at_sqrt_price(sqrt_price: float) -> int:
+    """Get the greatest tick whose price is at or below the given square root price"""
+    return math.floor(2 * math.log(sqrt_price) / math.log(1.0001))
+
+
+class ConcentratedLiquidityAMM:
+    """Represents a zero-fee concentrated liquidity market between two assets A and B
+
+    LPs provide liquidity L over a tick range [tick_lower, tick_upper). Within a range
+    the market behaves like a constant product market with virtual reserves L / sqrt(P)
+    of A and L * sqrt(P) of B, where P is the price of B in A. The active liquidity only
+    changes when the price crosses an initialized tick, so initialized ticks are kept in
+    a sorted index: a swap crossing k of them costs O(k + log n) for n initialized ticks.
+    """
+    def __init__(self, price: float):
+        """Create an empty market at price, the price of B in A (what price_oracle_asset_b returns)"""
+        if math.isfinite(price) and price > 0:
+            self.sqrt_price = math.sqrt(price)
+        else:
+            raise ValueError("price must be finite and greater than 0")
+
+        self.tick = tick_at_sqrt_price(self.sqrt_price)
+        if not MIN_TICK <= self.tick < MAX_TICK:
+            raise ValueError("price out of range")
+
+        # Liquidity of the positions whose range contains the current tick
+        self.liquidity = 0
+        # Actual coins held by the pool
+        self.reserves_a = 0.0
+        self.reserves_b = 0.0
+        # Liquidity per (tick_lower, tick_upper) range
+        self.positions: Dict[Tuple[int, int], int] = {}
+
+        # Sorted index of initialized ticks, i.e. ticks that are the boundary of a position
+        self._ticks: List[int] = []
+        # Liquidity added to (removed from) the active liquidity when crossing a tick upwards (downwards)
+        self._liquidity_net: Dict[int, int] = {}
+        # Total liquidity referencing a tick, the tick is initialized while this is non-zero
+        self._liquidity_gross: Dict[int, int] = {}
+
+    def _update_tick(self, tick: int, liquidity_delta: int, upper: bool) -> None:
+        if tick not in self._liquidity_gross:
+            bisect.insort(self._ticks, tick)
+            self._liquidity_gross[tick] = 0
+            self._liquidity_net[tick] = 0
+
+        self._liquidity_gross[tick] += liquidity_delta
+        self._liquidity_net[tick] += -liquidity_delta if upper else liquidity_delta
+
+        if self._liquidity_gross[tick] == 0:
+            del self._ticks[bisect.bisect_left(self._ticks, tick)]
+            del self._liquidity_gross[tick]
+            del self._liquidity_net[tick]
+
+    def _amounts_for_liquidity(self, tick_lower: int, tick_upper: int, liquidity: int) -> Tuple[float, float]:
+        """Get the amounts of A and B backing liquidity over a range at the current price"""
+        sqrt_lower = sqrt_price_at_tick(tick_lower)
+        sqrt_upper = sqrt_price_at_tick(tick_upper)
+        if self.tick < tick_lower:
+            # Price is below the range, it is all A
+            return liquidity * (1 / sqrt_lower - 1 / sqrt_upper), 0.0
+        elif self.tick < tick_upper:
+            return liquidity * (1 / self.sqrt_price - 1 / sqrt_upper), liquidity * (self.sqrt_price - sqrt_lower)
+        else:
+            # Price is above the range, it is all B
+            return 0.0, liquidity * (sqrt_upper - sqrt_lower)
+
+    def _modify_position(self, tick_lower: int, tick_upper: int, liquidity_delta: int) -> None:
+        self._update_tick(tick_lower, liquidity_delta, upper=False)
+        self._update_tick(tick_upper, liquidity_delta, upper=True)
+        if tick_lower <= self.tick < tick_upper:
+            self.liquidity += liquidity_delta
+
+        position = self.positions.get((tick_lower, tick_upper), 0) + liquidity_delta
+        if position > 0:
+            self.positions[(tick_lower, tick_upper)] = position
+        else:
+            del self.positions[(tick_lower, tick_upper)]
+
+    def add_liquidity(self, tick_lower: int, tick_upper: int, liquidity: int) -> Tuple[float, float]:
+        """Provide liquidity over [tick_lower, tick_upper). Returns the amounts of A and B deposited."""
+        if not MIN_TICK <= tick_lower < tick_upper <= MAX_TICK:
+            raise ValueError("ticks must satisfy MIN_TICK <= tick_lower < tick_upper <= MAX_TICK")
+        if liquidity <= 0:
+            raise ValueError("liquidity must be positive")
+
+        amount_a, amount_b = self._amounts_for_liquidity(tick_lower, tick_upper, liquidity)
+        self._modify_position(tick_lower, tick_upper, liquidity)
+        self.reserves_a += amount_a
+        self.reserves_b += amount_b
+        return amount_a, amount_b
+
+    def remove_liquidity(self, tick_lower: int, tick_upper: int, liquidity: int) -> Tuple[float, float]:
+        """Withdraw liquidity from [tick_lower, tick_upper). Returns the amounts of A and B withdrawn."""
+        if liquidity <= 0:
+            raise ValueError("liquidity must be positive")
+        if self.positions.get((tick_lower, tick_upper), 0) < liquidity:
+            raise ValueError("insufficient liquidity in position")
+
+        amount_a, amount_b = self._amounts_for_liquidity(tick_lower, tick_upper, liquidity)
+        # Float rounding must never pay out more than the pool holds
+        amount_a = min(amount_a, self.reserves_a)
+        amount_b = min(amount_b, self.reserves_b)
+        self._modify_position(tick_lower, tick_upper, -liquidity)
+        self.reserves_a -= amount_a
+        self.reserves_b -= amount_b
+        return amount_a, amount_b
+
+    def price_oracle_asset_a(self) -> float:
+        """Get current marginal price of asset A in B"""
+        return 1 / self.sqrt_price ** 2
+
+    def price_oracle_asset_b(self) -> float:
+        """Get current marginal price of asset B in A"""
+        return self.sqrt_price ** 2
+
+    def _swap_a_for_b(self, delta_a: float) -> Optional[Tuple[float, float, int, int]]:
+        """Walk the curve down for delta_a coins A in, without updating the state.
+
+        Returns the amount of B out and the new (sqrt_price, tick, liquidity), or None if
+        there isn't enough liquidity below the current price to absorb delta_a.
+        """
+        remaining = delta_a
+        amount_out = 0.0
+        sqrt_price, tick, liquidity = self.sqrt_price, self.tick, self.liquidity
+        # Next initialized tick at or below the current tick
+        i = bisect.bisect_right(self._ticks, tick) - 1
+
+        while remaining > 0:
+            if i < 0:
+                return None
+            next_tick = self._ticks[i]
+            sqrt_target = sqrt_price_at_tick(next_tick)
+
+            if liquidity > 0:
+                needed = liquidity * (1 / sqrt_target - 1 / sqrt_price)
+                if remaining < needed:
+                    # Swap ends within this range
+                    new_sqrt_price = liquidity * sqrt_price / (liquidity + remaining * sqrt_price)
+                    amount_out += liquidity * (sqrt_price - new_sqrt_price)
+                    return amount_out, new_sqrt_price, max(tick_at_sqrt_price(new_sqrt_price), next_tick), liquidity
+                remaining -= needed
+                amount_out += liquidity * (sqrt_price - sqrt_target)
+
+            # Cross the tick
+            sqrt_price = sqrt_target
+            liquidity -= self._liquidity_net[next_tick]
+            tick = next_tick - 1
+            i -= 1
+
+        return amount_out, sqrt_price, tick, liquidity
+
+    def _swap_b_for_a(self, delta_b: float) -> Optional[Tuple[float, float, int, int]]:
+        """Walk the curve up for delta_b coins B in, without updating the state.
+
+        Returns the amount of A out and the new (sqrt_price, tick, liquidity), or None if
+        there isn't enough liquidity above the current price to absorb delta_b.
+        """
+        remaining = delta_b
+        amount_out = 0.0
+        sqrt_price, tick, liquidity = self.sqrt_price, self.tick, self.liquidity
+        # Next initialized tick above the current tick
+        i = bisect.bisect_right(self._ticks, tick)
+
+        while remaining > 0:
+            if i == len(self._ticks):
+                return None
+            next_tick = self._ticks[i]
+            sqrt_target = sqrt_price_at_tick(next_tick)
+
+            if liquidity > 0:
+                needed = liquidity * (sqrt_target - sqrt_price)
+                if remaining < needed:
+                    # Swap ends within this range
+                    new_sqrt_price = sqrt_price + remaining / liquidity
+                    amount_out += liquidity * (1 / sqrt_price - 1 / new_sqrt_price)
+                    return amount_out, new_sqrt_price, min(tick_at_sqrt_price(new_sqrt_price), next_tick - 1), liquidity
+                remaining -= needed
+                amount_out += liquidity * (1 / sqrt_price - 1 / sqrt_target)
+
+            # Cross the tick
+            sqrt_price = sqrt_target
+            liquidity += self._liquidity_net[next_tick]
+            tick = next_tick
+            i += 1
+
+        return amount_out, sqrt_price, tick, liquidity
+
+    def quote_a_for_b(self, delta_a: int) -> Optional[float]:
+        """Get the amount of B paid out for delta_a coins A, None if there isn't enough liquidity"""
+        swap = self._swap_a_for_b(delta_a)
+        return swap[0] if swap else None
+
+    def quote_b_for_a(self, delta_b: int) -> Optional[float]:
+        """Get the amount of A paid out for delta_b coins B, None if there isn't enough liquidity"""
+        swap = self._swap_b_for_a(delta_b)
+        return swap[0] if swap else None
+
+    def apply_trade(self, trade: Trade) -> bool:
+        """See if trade is valid, if so execute and update the reserves
+
+        The full input of the trade is swapped along the curve. The trade is valid if the
+        resulting output covers the output the trade asks for, any excess stays in the pool.
+        """
+        if isinstance(trade, TradeAforB):
+            swap = self._swap_a_for_b(trade.delta_a)
+            if swap is not None and swap[0] >= trade.delta_b and trade.delta_b < self.reserves_b:
+                _, self.sqrt_price, self.tick, self.liquidity = swap
+                self.reserves_a += trade.delta_a
+                self.reserves_b -= trade.delta_b
+                print('trade executed')
+                return True
+            else:
+                print('trade not executed')
+                return False
+        elif isinstance(trade, TradeBforA):
+            swap = self._swap_b_for_a(trade.delta_b)
+            if swap is not None and swap[0] >= trade.delta_a and trade.delta_a < self.reserves_a:
+                _, self.sqrt_price, self.tick, self.liquidity = swap
+                self.reserves_a -= trade.delta_a
+                self.reserves_b += trade.delta_b
+                print('trade executed')
+                return True
+            else:
+                print('trade not executed')
+                return False
+        else:
+            print('unknown trade type')
+            return False
+
+
+if __name__ == "__main__":
+    market = ConcentratedLiquidityAMM(10)
+    # One wide position and one concentrated around the current price
+    print('deposited:', market.add_liquidity(-10000, 50000, 1000))
+    print('deposited:', market.add_liquidity(22000, 24000, 10000))
+    print('current price of A:', market.price_oracle_asset_a())
+    print('current price of B:', market.price_oracle_asset_b())
+
+    valid_trade = TradeBforA(10, 101)
+    assert market.quote_b_for_a(valid_trade.delta_b) >= valid_trade.delta_a
+    assert market.apply_trade(valid_trade) == True
+
+    invalid_trade = TradeBforA(10, 1)
+    assert market.apply_trade(invalid_trade) == False
+
+    # Crosses the upper tick of the concentrated position
+    large_trade = TradeBforA(100, 5000)
+    assert market.apply_trade(large_trade) == True
+    assert market.tick >= 24000
@@ -61,7 +61,15 @@ class AMM:
 
     def price_oracle_asset_b(self) -> float:
         """Get current marginal price of asset B in A"""
-        return self.reserves_b / self.reserves_a 
+        return self.reserves_b / self.reserves_a
+
+    def quote_a_for_b(self, delta_a: int) -> float:
+        """Get the amount of B paid out for delta_a coins A at the current reserves"""
+        return self.reserves_b * delta_a / (self.reserves_a + delta_a)
+
+    def quote_b_for_a(self, delta_b: int) -> float:
+        """Get the amount of A paid out for delta_b coins B at the current reserves"""
+        return self.reserves_a * delta_b / (self.reserves_b + delta_b)
 
     def apply_trade(self, trade: Trade) -> bool:
         """See if trade is valid, if so execute and update the reserves"""
@@ -0,0 +1,441 @@
+#!/usr/bin/python3
+"""Benchmarks for the AMMs and the tendermint toy implementation.
+
+    python3 benchmarks/bench.py run -o before.json
+    python3 benchmarks/bench.py run -o after.json --profile tracemalloc
+    python3 benchmarks/bench.py compare before.json after.json
+"""
+import argparse
+import collections
+import contextlib
+import cProfile
+import json
+import logging
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO, 'amm'))
+sys.path.insert(0, os.path.join(REPO, 'tendermint'))
+
+from toy_amm import AMM, TradeAforB, TradeBforA
+from concentrated_amm import ConcentratedLiquidityAMM
+from tendermint import app
+from tendermint.log import TendermintMessageLog
+from tendermint.messages import PREVOTE
+
+# Importing tendermint logs everything at DEBUG to stdout
+logging.getLogger().setLevel(logging.WARNING)
+
+DEFAULT_VALIDATORS = [4, 7, 10, 16, 31, 64, 100]
+
+# A run does some work and returns the number of operations done. Given a list, a target
+# that times operations one by one appends the latency of each operation in ns to it.
+Run = Callable[[Optional[List[int]]], int]
+
+
+class Target:
+    def __init__(self, name: str, unit: str, setup: Callable[[], Run], latency: bool = False):
+        self.name = name
+        self.unit = unit
+        # Builds fresh state for each run, so runs are independent and setup isn't timed
+        self.setup = setup
+        self.latency = latency
+
+
+@contextlib.contextmanager
+def quiet():
+    # The AMMs print on every trade
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def amm_trades(seed: int, num_trades: int) -> List:
+    """Alternating trades that are all valid when replayed in order on a fresh AMM"""
+    rng = random.Random(seed)
+    with quiet():
+        market = AMM(10**9, 10**10)
+        trades = []
+        while len(trades) < num_trades:
+            if len(trades) % 2 == 0:
+                delta_a = rng.randint(1, 1000)
+                trade = TradeAforB(delta_a, math.floor(market.quote_a_for_b(delta_a)))
+            else:
+                delta_b = rng.randint(1000, 10000)
+                trade = TradeBforA(math.floor(market.quote_b_for_a(delta_b)), delta_b)
+            assert market.apply_trade(trade)
+            trades.append(trade)
+    return trades
+
+
+def clamm_market(seed: int, num_positions: int = 1000) -> ConcentratedLiquidityAMM:
+    rng = random.Random(seed)
+    market = ConcentratedLiquidityAMM(10)
+    for _ in range(num_positions):
+        tick_lower = rng.randint(13000, 32999)
+        tick_upper = rng.randint(tick_lower + 1, 33000)
+        market.add_liquidity(tick_lower, tick_upper, rng.randint(1000, 100000))
+    return market
+
+
+def clamm_trades(seed: int, num_trades: int) -> List:
+    """Alternating trades that are all valid when replayed in order on a fresh clamm_market"""
+    rng = random.Random(seed)
+    with quiet():
+        market = clamm_market(seed)
+        trades = []
+        while len(trades) < num_trades:
+            if len(trades) % 2 == 0:
+                delta_a = rng.randint(1, 10000)
+                trade = TradeAforB(delta_a, math.floor(market.quote_a_for_b(delta_a)))
+            else:
+                delta_b = rng.randint(10000, 100000)
+                trade = TradeBforA(math.floor(market.quote_b_for_a(delta_b)), delta_b)
+            assert market.apply_trade(trade)
+            trades.append(trade)
+    return trades
+
+
+def apply_trades(new_market: Callable, trades: List) -> Callable[[], Run]:
+    def setup() -> Run:
+        with quiet():
+            market = new_market()
+
+        def run(latencies=None):
+            apply_trade = market.apply_trade
+            with quiet():
+                if latencies is None:
+                    for trade in trades:
+                        apply_trade(trade)
+                else:
+                    for trade in trades:
+                        start = time.perf_counter_ns()
+                        apply_trade(trade)
+                        latencies.append(time.perf_counter_ns() - start)
+            return len(trades)
+        return run
+    return setup
+
+
+def quotes(new_market: Callable, seed: int, num_quotes: int, max_a: int, max_b: int) -> Callable[[], Run]:
+    rng = random.Random(seed)
+    sizes = []
+    for _ in range(num_quotes):
+        a_for_b = rng.random() < 0.5
+        sizes.append((a_for_b, rng.randint(1, max_a if a_for_b else max_b)))
+
+    def setup() -> Run:
+        with quiet():
+            market = new_market()
+
+        def run(latencies=None):
+            quote_a_for_b, quote_b_for_a = market.quote_a_for_b, market.quote_b_for_a
+            if latencies is None:
+                for a_for_b, size in sizes:
+                    (quote_a_for_b if a_for_b else quote_b_for_a)(size)
+            else:
+                for a_for_b, size in sizes:
+                    quote = quote_a_for_b if a_for_b else quote_b_for_a
+                    start = time.perf_counter_ns()
+                    quote(size)
+                    latencies.append(time.perf_counter_ns() - start)
+            return len(sizes)
+        return run
+    return setup
+
+
+def log_add(num_messages: int) -> Callable[[], Run]:
+    messages = [PREVOTE(0, 0, 'valid' if i % 4 else None) for i in range(num_messages)]
+
+    def setup() -> Run:
+        def run(latencies=None):
+            message_log = TendermintMessageLog(0)
+            for msg in messages:
+                message_log.add_prevote(msg)
+                message_log.add_precommit(msg)
+            return 2 * len(messages)
+        return run
+    return setup
+
+
+def log_quorum_check(num_validators: int, num_checks: int) -> Callable[[], Run]:
+    quorum = 2 * ((num_validators - 1) // 3) + 1
+
+    def setup() -> Run:
+        # A quorum of prevotes for the proposal and every other peer voting for its own value,
+        # so the log holds as many distinct values as it can for n validators
+        message_log = TendermintMessageLog(0)
+        for i in range(num_validators - 1):
+            message_log.add_prevote(PREVOTE(0, 0, 'valid' if i < quorum else f'value {i}'))
+
+        def run(latencies=None):
+            reached = 0
+            for _ in range(num_checks):
+                reached += message_log.num_prevotes() >= quorum
+                reached += message_log.num_prevotes_for('valid') >= quorum
+            assert reached == 2 * num_checks
+            return 2 * num_checks
+        return run
+    return setup
+
+
+class _Inbox:
+    """Stands in for a node's queue.Queue, delivering through a FIFO shared by the whole network.
+
+    Messages are handled in the order they were sent, so a node never sees a message for the
+    next height before the votes that let it commit the current one.
+    """
+    def __init__(self, node_num: int, network: collections.deque):
+        self.node_num = node_num
+        self.network = network
+
+    def put(self, msg) -> None:
+        self.network.append((self.node_num, msg))
+
+
+class _BenchProcess(app.TendermintProcess):
+    def startTimer(self, target) -> None:
+        # Every validator is correct and messages are never lost, so no timeout can fire
+        # before the height is committed. Skip starting a thread that sleeps for seconds.
+        pass
+
+
+def network_heights(num_validators: int, heights: int) -> Callable[[], Run]:
+    def setup() -> Run:
+        app.n = num_validators
+        app.f = (num_validators - 1) // 3
+        app.startupDelay = app.broadcastDelay = app.roundDelay = 0
+
+        network = collections.deque()
+        inboxes = {node_num: _Inbox(node_num, network) for node_num in range(num_validators)}
+        nodes = [_BenchProcess(node_num, inboxes) for node_num in range(num_validators)]
+
+        def run(latencies=None):
+            for node in nodes:
+                node.startRound(node.round_p)
+            while min(node.h_p for node in nodes) < heights:
+                if not network:
+                    raise RuntimeError(f"network of {num_validators} validators stalled at height "
+                                       f"{min(node.h_p for node in nodes)}")
+                node_num, msg = network.popleft()
+                nodes[node_num].handle_event(msg)
+            return heights
+        return run
+    return setup
+
+
+def targets(seed: int, quick: bool, validators: List[int]) -> List[Target]:
+    num_trades = 2000 if quick else 20000
+    num_ops = 10000 if quick else 100000
+    heights = 3 if quick else 10
+
+    amm_trade_list = amm_trades(seed, num_trades)
+    clamm_trade_list = clamm_trades(seed, num_trades)
+    new_amm = lambda: AMM(10**9, 10**10)
+    new_clamm = lambda: clamm_market(seed)
+
+    result = [
+        Target('amm.trades', 'trades/s', apply_trades(new_amm, amm_trade_list), latency=True),
+        Target('amm.quote', 'quotes/s', quotes(new_amm, seed, num_ops, 1000, 10000), latency=True),
+        Target('clamm.trades', 'trades/s', apply_trades(new_clamm, clamm_trade_list), latency=True),
+        Target('clamm.quote', 'quotes/s', quotes(new_clamm, seed, num_ops, 10000, 100000), latency=True),
+        Target('tendermint.log.add', 'ops/s', log_add(num_ops)),
+    ]
+    for num_validators in validators:
+        result.append(Target(f'tendermint.log.quorum_check.n{num_validators}', 'ops/s',
+                             log_quorum_check(num_validators, num_ops)))
+    for num_validators in validators:
+        result.append(Target(f'tendermint.network.n{num_validators}', 'heights/s',
+                             network_heights(num_validators, heights)))
+    return result
+
+
+def percentile(latencies: List[int], q: float) -> int:
+    return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+
+def measure(target: Target, repeats: int) -> Dict:
+    samples = []
+    latencies = []
+    for _ in range(repeats):
+        run = target.setup()
+        start = time.perf_counter()
+        ops = run(None)
+        samples.append(ops / (time.perf_counter() - start))
+        if target.latency:
+            # Timing each operation has overhead of its own, so latencies come from a separate run
+            target.setup()(latencies)
+
+    result = {
+        'unit': target.unit,
+        'throughput': max(samples),
+        'median': statistics.median(samples),
+        'samples': samples,
+    }
+    if latencies:
+        latencies.sort()
+        result['latency_ns'] = {
+            'p50': percentile(latencies, 0.5),
+            'p99': percentile(latencies, 0.99),
+            'max': latencies[-1],
+        }
+    return result
+
+
+def profile(target: Target, mode: str, profile_dir: str, result: Dict) -> None:
+    # A separate run, so profiling overhead doesn't skew the throughput numbers
+    run = target.setup()
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.runcall(run, None)
+        os.makedirs(profile_dir, exist_ok=True)
+        path = os.path.join(profile_dir, f'{target.name}.prof')
+        profiler.dump_stats(path)
+        result['profile'] = path
+    elif mode == 'tracemalloc':
+        tracemalloc.start()
+        try:
+            run(None)
+            _, result['peak_bytes'] = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_command(args) -> int:
+    validators = args.validators or DEFAULT_VALIDATORS
+    for num_validators in validators:
+        if num_validators < 4:
+            print(f'need at least 4 validators to tolerate a fault, got {num_validators}', file=sys.stderr)
+            return 2
+
+    results = {}
+    for target in targets(args.seed, args.quick, validators):
+        if args.filter and args.filter not in target.name:
+            continue
+        result = measure(target, args.repeats)
+        if args.profile:
+            profile(target, args.profile, args.profile_dir, result)
+        results[target.name] = result
+        print(f"{target.name:40} {result['throughput']:14.1f} {target.unit}", file=sys.stderr)
+
+    output = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'repeats': args.repeats,
+            'quick': args.quick,
+            'profile': args.profile,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+    else:
+        json.dump(output, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+def compare(old: Dict, new: Dict, threshold: float) -> Tuple[List[str], List[str]]:
+    """Get the regressions between two sets of results, i.e. throughput that dropped or
+    peak memory that grew by more than threshold (a fraction), and the targets whose peak
+    memory was only measured in one of them"""
+    regressions = []
+    uncompared = []
+    for name in sorted(old.keys() & new.keys()):
+        old_throughput, new_throughput = old[name]['throughput'], new[name]['throughput']
+        change = (new_throughput - old_throughput) / old_throughput
+        line = f"{name:40} {old_throughput:14.1f} -> {new_throughput:14.1f} {new[name]['unit']} ({change:+.1%})"
+        if change < -threshold:
+            regressions.append(f'throughput: {line}')
+
+        if 'peak_bytes' in old[name] and 'peak_bytes' in new[name]:
+            old_peak, new_peak = old[name]['peak_bytes'], new[name]['peak_bytes']
+            change = (new_peak - old_peak) / old_peak if old_peak else 0.0
+            if change > threshold:
+                regressions.append(f'memory:     {name:40} {old_peak} -> {new_peak} bytes ({change:+.1%})')
+        elif 'peak_bytes' in old[name] or 'peak_bytes' in new[name]:
+            uncompared.append(name)
+    return regressions, uncompared
+
+
+def compare_command(args) -> int:
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    # Runs with different workloads can't be compared, different repeats only make them noisier
+    for key in ('quick', 'seed', 'repeats'):
+        if old['meta'].get(key) != new['meta'].get(key):
+            print(f"{key} differs: {old['meta'].get(key)} (old) vs {new['meta'].get(key)} (new)")
+    if any(old['meta'].get(key) != new['meta'].get(key) for key in ('quick', 'seed')):
+        print('runs used different workloads, not comparing')
+        return 2
+    old, new = old['results'], new['results']
+
+    for name in sorted(old.keys() ^ new.keys()):
+        print(f'only in {"old" if name in old else "new"}: {name}')
+
+    regressions, uncompared = compare(old, new, args.threshold)
+    for name in uncompared:
+        print(f'memory not compared, peak_bytes only in one run: {name}')
+    for regression in regressions:
+        print(regression)
+    if regressions:
+        print(f'{len(regressions)} regression(s) over {args.threshold:.0%}')
+        return 1
+    print(f'no regressions over {args.threshold:.0%}')
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='run the benchmarks and emit JSON results')
+    run_parser.add_argument('-o', '--output', help='write results here instead of stdout')
+    run_parser.add_argument('--repeats', type=int, default=5)
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--quick', action='store_true', help='smaller workloads, for a smoke test')
+    run_parser.add_argument('--filter', help='only run targets whose name contains this')
+    run_parser.add_argument('--validators', type=int, nargs='+',
+                            help=f'validator counts for the tendermint targets (default {DEFAULT_VALIDATORS})')
+    run_parser.add_argument('--profile', choices=['cprofile', 'tracemalloc'],
+                            help='also profile each target in a separate run')
+    run_parser.add_argument('--profile-dir', default='profiles', help='where cprofile writes .prof files')
+    run_parser.set_defaults(func=run_command)
+
+    compare_parser = subparsers.add_parser('compare', help='flag regressions between two runs')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='fractional change that counts as a regression (default 0.1)')
+    compare_parser.set_defaults(func=compare_command)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -24,6 +24,12 @@ n = 10
 # Total voting power of faulty processes in the system
 f = 3
 
+# Pauses (in seconds) for demo purposes so things aren't so fast in scrollback.
+# Set these to 0 to run the protocol at full speed.
+startupDelay = 2
+broadcastDelay = 0.1
+roundDelay = 1
+
 # Each round has a dedicated proposer.
 # Mapping of rounds to proposers is known by all processes.
 def proposer(h: int, round: int) -> int:
@@ -99,40 +105,40 @@ class TendermintProcess:
         self.receive_q.put(msg)
 
     def broadcast(self, message):
-        # for demo purposes so things aren't so fast in scrollback
-        time.sleep(0.1)
+        time.sleep(broadcastDelay)
         for node_num in self.get_network_peers():
             self.send_to_node(node_num, message)
 
     def process_events(self) -> NoReturn:
-        time.sleep(2)  # Wait for nodes to start
+        time.sleep(startupDelay)  # Wait for nodes to start
         self.startRound(self.round_p)
         while True:
-            event = self.receive()
-
-            if isinstance(event, PROPOSAL):
-                logger.debug(f"node {self.p} - Got PROPOSAL - {event}")
-                self.message_log.add_proposal(event)
-                self.process(event)
-            elif isinstance(event, PREVOTE):
-                logger.debug(f"node {self.p} - Got PREVOTE - {event}")
-                self.message_log.add_prevote(event)
-                self.process(event)
-            elif isinstance(event, PRECOMMIT):
-                logger.debug(f"node {self.p} - Got PRECOMMIT - {event}")
-                self.message_log.add_precommit(event)
-                self.process(event)
-            elif isinstance(event, ProposalTimeout):
-                logger.info(f"node {self.p} - BOOM - ProposalTimeout hit for round {event.round} and block height {event.height}")
-                self.onTimeoutPropose(event.height, event.round)
-            elif isinstance(event, PrevoteTimeout):
-                logger.info(f"node {self.p} - BOOM - PrevoteTimeout hit for round {event.round} and block height {event.height}")
-                self.onTimeoutPrevote(event.height, event.round)
-            elif isinstance(event, PrecommitTimeout):
-                logger.info(f"node {self.p} - BOOM - PrecommitTimer hit for round {event.round} and block height {event.height}")
-                self.onTimeoutPrecommit(event.height, event.round)
-            else:
-                logger.error(f"node {self.p} - Don't know what this event/message is... skipping")
+            self.handle_event(self.receive())
+
+    def handle_event(self, event) -> None:
+        if isinstance(event, PROPOSAL):
+            logger.debug(f"node {self.p} - Got PROPOSAL - {event}")
+            self.message_log.add_proposal(event)
+            self.process(event)
+        elif isinstance(event, PREVOTE):
+            logger.debug(f"node {self.p} - Got PREVOTE - {event}")
+            self.message_log.add_prevote(event)
+            self.process(event)
+        elif isinstance(event, PRECOMMIT):
+            logger.debug(f"node {self.p} - Got PRECOMMIT - {event}")
+            self.message_log.add_precommit(event)
+            self.process(event)
+        elif isinstance(event, ProposalTimeout):
+            logger.info(f"node {self.p} - BOOM - ProposalTimeout hit for round {event.round} and block height {event.height}")
+            self.onTimeoutPropose(event.height, event.round)
+        elif isinstance(event, PrevoteTimeout):
+            logger.info(f"node {self.p} - BOOM - PrevoteTimeout hit for round {event.round} and block height {event.height}")
+            self.onTimeoutPrevote(event.height, event.round)
+        elif isinstance(event, PrecommitTimeout):
+            logger.info(f"node {self.p} - BOOM - PrecommitTimer hit for round {event.round} and block height {event.height}")
+            self.onTimeoutPrecommit(event.height, event.round)
+        else:
+            logger.error(f"node {self.p} - Don't know what this event/message is... skipping")
 
     def process(self, message):
         # Algorithm 1, Line 22
@@ -158,7 +164,6 @@ class TendermintProcess:
         if self.step_p == 'prevote' and self.firstPrevote == False and self.message_log.num_prevotes() >= (2 * f + 1):
             self.firstPrevote = True
             self.onFirstPrevote()
-            return
 
         # Algorithm 1, Line 36
         for message in self.message_log.proposals():  # Try to see if the condition is met for any observed proposal.
@@ -181,7 +186,6 @@ class TendermintProcess:
         if self.firstPrecommit == False and self.message_log.num_precommits() >= (2 * f + 1):
             self.firstPrecommit = True
             self.onFirstPrecommit()
-            return
 
         # Algorithm 1, line 49 
         proposal = self.message_log.proposal(self.lockedValue_p)
@@ -253,7 +257,7 @@ class TendermintProcess:
         self.step_p = 'propose'
 
         # pausing to start the round for demo purposes
-        time.sleep(1)
+        time.sleep(roundDelay)
 
         if proposer(self.h_p, self.round_p) == self.p:  # We test if we are the proposer this round
             if self.validValue_p != None:
@@ -269,7 +273,11 @@ class TendermintProcess:
             self.send_to_node(self.p, proposed_msg)
         else:  # We're not the proposer this round, give the proposer some time
             self.proposalTimer = True
-            threading.Thread(target=self.startTimeoutProposal, args=(self.h_p, self.round_p)).start()
+            self.startTimer(self.startTimeoutProposal)
+
+    def startTimer(self, target) -> None:
+        # Timers run in their own thread and put a timeout event on our queue when they expire
+        threading.Thread(target=target, args=(self.h_p, self.round_p)).start()
 
     def startTimeoutProposal(self, height, round):
         while self.proposalTimer:
@@ -327,7 +335,7 @@ class TendermintProcess:
     """
     def onFirstPrevote(self):
         self.prevoteTimer = True
-        threading.Thread(target=self.startTimeoutPrevote, args=(self.h_p, self.round_p)).start()
+        self.startTimer(self.startTimeoutPrevote)
 
     def startTimeoutPrevote(self, height, round):
         while self.prevoteTimer:
@@ -371,7 +379,7 @@ class TendermintProcess:
     """
     def onFirstPrecommit(self):
         self.precommitTimer = True
-        threading.Thread(target=self.startTimeoutPrecommit, args=(self.h_p, self.round_p)).start()
+        self.startTimer(self.startTimeoutPrecommit)
 
     def startTimeoutPrecommit(self, height: int, round: int):
         while self.precommitTimer:
@@ -413,6 +421,6 @@ class TendermintProcess:
             self.locked = False
 
             # pausing between rounds for demo purposes
-            time.sleep(1)
+            time.sleep(roundDelay)
 
             self.startRound(self.round_p)